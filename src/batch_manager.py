@@ -1,11 +1,168 @@
 import os
 import json
-import jsonlines
+import mmap
 import time
+import hashlib
+import queue
+import random
 import datetime
+import asyncio
+import threading
 from typing import Dict, List
+import httpx
 import openai
 import anthropic
+from src.utils import json_loads, json_dumps_bytes
+
+OPENAI_BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Anthropic caps the number of requests per Message Batch
+ANTHROPIC_MAX_BATCH_REQUESTS = 10000
+# Below this many payloads the dedup hashing isn't worth the overhead
+DEDUP_MIN_PAYLOADS = 100
+# Anthropic caps concurrent result streams lower than the general poll bound
+ANTHROPIC_MAX_CONCURRENT_DOWNLOADS = 4
+# Journal appends between full rewrites of the jobs metadata file
+JOBS_COMPACT_EVERY = 100
+# Statuses a batch can never leave; anything else stays in the pending index
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+MAX_API_RETRIES = 5
+MAX_RETRY_DELAY = 60.0
+
+def _is_transient_error(e):
+    """True for rate-limit / connection / 5xx errors worth retrying."""
+    transient_types = (
+        openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+        anthropic.RateLimitError, anthropic.APIConnectionError, anthropic.APITimeoutError,
+    )
+    if isinstance(e, transient_types):
+        return True
+    status = getattr(e, 'status_code', None) or getattr(e, 'code', None)
+    return status in (429, 500, 502, 503, 504)
+
+def _retry_delay(e, attempt):
+    """Jittered exponential backoff, preferring the provider's Retry-After."""
+    response = getattr(e, 'response', None)
+    if response is not None:
+        retry_after = getattr(response, 'headers', {}).get('retry-after')
+        if retry_after:
+            try:
+                return min(float(retry_after), MAX_RETRY_DELAY)
+            except ValueError:
+                pass
+    return min((2 ** (attempt - 1)) + random.uniform(0, 1), MAX_RETRY_DELAY)
+
+# Below this size a buffered sequential read beats paying mmap setup cost
+MMAP_THRESHOLD = 100 * 1024 * 1024
+
+def _iter_result_lines(f):
+    """
+    Yields parsed JSON objects from an open binary JSONL result file.
+    Small files are read through the handle's buffer; files over
+    MMAP_THRESHOLD are memory-mapped so multi-GB batch outputs come
+    zero-copy from the page cache instead of being decoded through a
+    line-buffered reader.
+    """
+    size = os.fstat(f.fileno()).st_size
+    if size == 0:
+        return
+
+    if size < MMAP_THRESHOLD:
+        for line in f:
+            if line.strip():
+                yield json_loads(line)
+        return
+
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        if hasattr(mm, 'madvise'):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        for line in iter(mm.readline, b''):
+            if line.strip():
+                yield json_loads(line)
+    finally:
+        mm.close()
+
+def _parse_openai_line(line):
+    """Extracts (custom_id, response_text) from an OpenAI batch result line."""
+    custom_id = line.get('custom_id')
+    # Failed requests carry "response": null, so guard every level
+    body = (line.get('response') or {}).get('body') or {}
+    choice = (body.get('choices') or [{}])[0]
+    return custom_id, (choice.get('message') or {}).get('content', "")
+
+def _parse_anthropic_line(line):
+    """Extracts (custom_id, response_text) from an Anthropic batch result line."""
+    custom_id = line.get('custom_id')
+    response_text = ""
+    result = line.get('result') or {}
+    if result.get('type') == 'succeeded':
+        content_list = result.get('message', {}).get('content', [])
+        if content_list:
+            response_text = content_list[0].get('text', "")
+    return custom_id, response_text
+
+def _parse_google_line(line):
+    """Extracts (custom_id, response_text) from a Gemini batch result line."""
+    # Gemini Batch Output often matches input structure or uses custom_id if provided
+    custom_id = line.get('custom_id')
+    response_text = ""
+    try:
+        response_text = line['response']['candidates'][0]['content']['parts'][0]['text']
+    except (KeyError, IndexError, TypeError):
+        pass
+    return custom_id, response_text
+
+# Provider -> line parser, resolved once per result file rather than
+# re-branching on the provider string for every line.
+_LINE_PARSERS = {
+    "openai": _parse_openai_line,
+    "anthropic": _parse_anthropic_line,
+    "google": _parse_google_line,
+    "openai_compatible": _parse_openai_line
+}
+
+class TokenBucket:
+    """
+    Simple token-bucket rate limiter: acquire() blocks until a token is
+    available, refilling at `rate` tokens per second up to `capacity`.
+    Smooths bursts of submissions so they don't trip provider RPM limits.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                self._cond.wait(timeout=(1 - self.tokens) / self.rate)
+
+class _JsonArrayWriter:
+    """
+    Streams records to disk as a JSON array, one element at a time, so the
+    summary never has to hold every ~10-field record dict in memory at once.
+    """
+    def __init__(self, fh):
+        self.fh = fh
+        self.count = 0
+        fh.write(b'[')
+
+    def write(self, record):
+        self.fh.write(b',\n' if self.count else b'\n')
+        self.fh.write(json_dumps_bytes(record, indent=True))
+        self.count += 1
+
+    def close(self):
+        self.fh.write(b'\n]' if self.count else b']')
 
 # Gemini import
 try:
@@ -20,6 +177,22 @@ class BatchManager:
         self.config = config
         default_dir = config.get('output_dir', 'raw_outputs')
         self.jobs_file = config.get('batch', {}).get('metadata_file', os.path.join(default_dir, 'batch_jobs.json'))
+        self.jobs_index_file = os.path.join(os.path.dirname(self.jobs_file) or '.', 'jobs_index.json')
+        self.jobs_log_file = os.path.splitext(self.jobs_file)[0] + '.log'
+        self._jobs = None
+        self._jobs_index = None
+        self._jobs_dirty = False
+        self._last_flushed = {}
+        self._appends_since_compact = 0
+        self._compat_clients = {}
+        self._async_clients = {}
+
+        # Metadata writes happen on a dedicated thread so network-facing
+        # paths never block on disk; consecutive snapshots are coalesced.
+        self._write_queue = queue.Queue()
+        self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+
         self.setup_clients()
 
     def setup_clients(self):
@@ -27,30 +200,291 @@ class BatchManager:
         self.anthropic_key = os.getenv("ANTHROPIC_API_KEY")
         self.google_key = os.getenv("GOOGLE_API_KEY")
 
+        # Generous keep-alive pools so repeated polls reuse warm TLS
+        # connections instead of paying a handshake per retrieve/results call.
+        def _pool_limits():
+            return httpx.Limits(max_keepalive_connections=32, max_connections=64)
+
+        # Only the sync clients live for the whole session. The async ones
+        # are built per check_and_retrieve invocation (see _check_all): an
+        # httpx AsyncClient is bound to the event loop that opened its
+        # connections, and each asyncio.run starts a fresh loop, so a
+        # long-lived async client fails with "Event loop is closed" from
+        # the second poll cycle on.
         if self.openai_key:
-            self.openai_client = openai.OpenAI(api_key=self.openai_key)
-        
+            self.openai_client = openai.OpenAI(
+                api_key=self.openai_key,
+                http_client=httpx.Client(limits=_pool_limits(), timeout=30.0)
+            )
+
         if self.anthropic_key:
-            self.anthropic_client = anthropic.Anthropic(api_key=self.anthropic_key)
-            
+            self.anthropic_client = anthropic.Anthropic(
+                api_key=self.anthropic_key,
+                http_client=httpx.Client(limits=_pool_limits(), timeout=30.0)
+            )
+
         if self.google_key and HAS_GOOGLE:
             # Initialize official Google GenAI Client
             self.google_client = genai.Client(api_key=self.google_key)
         elif self.google_key and not HAS_GOOGLE:
             print("Warning: GOOGLE_API_KEY found but google-genai not installed.")
 
+        # Pre-emptive per-provider rate limiting for submission dispatch,
+        # sized to typical default RPM limits.
+        self._limiters = {
+            'openai': TokenBucket(rate=60 / 60.0, capacity=10),
+            'anthropic': TokenBucket(rate=50 / 60.0, capacity=5),
+            'google': TokenBucket(rate=60 / 60.0, capacity=8),
+        }
+
+    def _get_compat_client(self, env_key, base_url):
+        """
+        Returns a cached OpenAI-compatible client for (env_key, base_url).
+        Reconstructing the client per call would discard the warm keep-alive
+        connection pool and pay a TLS handshake every time.
+        """
+        key = (env_key, base_url)
+        client = self._compat_clients.get(key)
+        if client is None:
+            limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            client = openai.OpenAI(
+                api_key=os.getenv(env_key), base_url=base_url,
+                http_client=httpx.Client(limits=limits, timeout=30.0)
+            )
+            self._compat_clients[key] = client
+        return client
+
+    def _get_async_client(self, provider, env_key=None, base_url=None):
+        """
+        Returns an async client scoped to the current check cycle. The cache
+        in self._async_clients is created and torn down inside _check_all, so
+        every client lives and dies on the loop that opened its connections.
+        """
+        key = (provider, env_key, base_url)
+        client = self._async_clients.get(key)
+        if client is None:
+            limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+            if provider == "openai":
+                client = openai.AsyncOpenAI(
+                    api_key=self.openai_key,
+                    http_client=httpx.AsyncClient(limits=limits, timeout=30.0)
+                )
+            elif provider == "anthropic":
+                client = anthropic.AsyncAnthropic(
+                    api_key=self.anthropic_key,
+                    http_client=httpx.AsyncClient(limits=limits, timeout=30.0)
+                )
+            elif provider == "openai_compatible":
+                client = openai.AsyncOpenAI(
+                    api_key=os.getenv(env_key), base_url=base_url,
+                    http_client=httpx.AsyncClient(limits=limits, timeout=30.0)
+                )
+            elif provider == "google":
+                # The .aio surface lazily opens its own async session, so it
+                # needs a fresh Client per loop just like the others
+                client = genai.Client(api_key=self.google_key)
+            else:
+                raise ValueError(f"No async client for provider: {provider}")
+            self._async_clients[key] = client
+        return client
+
+    async def _close_async_clients(self):
+        """Closes the per-cycle async clients before their loop shuts down."""
+        for client in self._async_clients.values():
+            close = getattr(client, 'aclose', None) or getattr(client, 'close', None)
+            if close is None:
+                continue
+            try:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception:
+                pass
+        self._async_clients = {}
+
+    def _with_retries(self, call, description):
+        """
+        Calls a provider API function, retrying transient failures with
+        jittered exponential backoff so a single 429/5xx doesn't abort a run.
+        Non-transient errors propagate immediately.
+        """
+        for attempt in range(1, MAX_API_RETRIES + 1):
+            try:
+                return call()
+            except Exception as e:
+                if attempt == MAX_API_RETRIES or not _is_transient_error(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"  {description} failed (attempt {attempt}/{MAX_API_RETRIES}): {e}. "
+                      f"Retrying in {delay:.1f}s...")
+                time.sleep(delay)
+
+    async def _with_retries_async(self, call, description):
+        """Async twin of _with_retries for the concurrent status checks."""
+        for attempt in range(1, MAX_API_RETRIES + 1):
+            try:
+                return await call()
+            except Exception as e:
+                if attempt == MAX_API_RETRIES or not _is_transient_error(e):
+                    raise
+                delay = _retry_delay(e, attempt)
+                print(f"  {description} failed (attempt {attempt}/{MAX_API_RETRIES}): {e}. "
+                      f"Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    @property
+    def jobs(self):
+        """Job metadata, loaded from disk once and cached for the session."""
+        if self._jobs is None:
+            jobs = {}
+            if os.path.exists(self.jobs_file):
+                with open(self.jobs_file, 'rb') as f:
+                    jobs = json_loads(f.read())
+            # Replay the append log tail on top of the last compacted snapshot
+            try:
+                with open(self.jobs_log_file, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            entry = json_loads(line)
+                        except ValueError:
+                            break  # truncated tail from an interrupted append
+                        jobs[entry['id']] = entry['job']
+            except FileNotFoundError:
+                pass
+            self._jobs = jobs
+            self._last_flushed = {bid: dict(job) for bid, job in jobs.items()}
+        return self._jobs
+
+    @property
+    def jobs_index(self):
+        """
+        Small side index of batch ids still worth visiting, so poll and
+        processing cycles iterate O(active) ids instead of the full job
+        history accumulated across runs.
+        """
+        if self._jobs_index is None:
+            # A non-empty append log means the index file may be stale, so
+            # rebuild from the replayed job metadata instead of trusting it.
+            log_tail = os.path.exists(self.jobs_log_file) and os.path.getsize(self.jobs_log_file) > 0
+            if not log_tail and os.path.exists(self.jobs_index_file):
+                with open(self.jobs_index_file, 'rb') as f:
+                    self._jobs_index = json_loads(f.read())
+            else:
+                self._jobs_index = self._build_jobs_index(self.jobs)
+        return self._jobs_index
+
+    def _build_jobs_index(self, jobs):
+        return {
+            "pending": [batch_id for batch_id, job in jobs.items()
+                        if job.get('status') not in TERMINAL_STATUSES],
+            "unprocessed": [batch_id for batch_id, job in jobs.items()
+                            if job.get('status') == 'completed' and not job.get('results_processed')]
+        }
+
     def load_jobs(self):
-        if os.path.exists(self.jobs_file):
-            with open(self.jobs_file, 'r') as f:
-                return json.load(f)
-        return {}
+        return self.jobs
 
     def save_jobs(self, jobs):
+        # Mutations only mark the cache dirty; flush_jobs() does the disk write
+        self._jobs = jobs
+        self._jobs_dirty = True
+
+    def flush_jobs(self):
+        if not self._jobs_dirty or self._jobs is None:
+            return
+        # Rebuild the active-job index, then persist only the jobs that
+        # actually changed as O(changed) appends to the journal; the writer
+        # thread periodically compacts the log back into jobs.json.
+        self._jobs_index = self._build_jobs_index(self._jobs)
+        changed = {bid: job for bid, job in self._jobs.items()
+                   if self._last_flushed.get(bid) != job}
+        self._last_flushed = {bid: dict(job) for bid, job in self._jobs.items()}
+        self._jobs_dirty = False
+        if not changed:
+            return
+
+        self._appends_since_compact += len(changed)
+        if self._appends_since_compact >= JOBS_COMPACT_EVERY:
+            self._appends_since_compact = 0
+            self._write_queue.put(('compact', (dict(self._jobs), dict(self._jobs_index))))
+        else:
+            lines = [json_dumps_bytes({"op": "set", "id": bid, "job": job}) + b'\n'
+                     for bid, job in changed.items()]
+            self._write_queue.put(('append', lines))
+
+    def close(self):
+        """Drains pending metadata writes. Call before process exit."""
+        self.flush_jobs()
+        if self._jobs is not None:
+            # Final compaction leaves jobs.json authoritative and the log empty
+            index = self._jobs_index or self._build_jobs_index(self._jobs)
+            self._write_queue.put(('compact', (dict(self._jobs), dict(index))))
+            self._appends_since_compact = 0
+        self._write_queue.put(None)
+        self._writer_thread.join(timeout=10)
+
+    def _writer_loop(self):
+        shutdown = False
+        while not shutdown:
+            item = self._write_queue.get()
+            if item is None:
+                break
+            # Brief pause lets a burst of flushes coalesce into one write
+            time.sleep(0.05)
+            items = [item]
+            while True:
+                try:
+                    nxt = self._write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    shutdown = True
+                    break
+                items.append(nxt)
+
+            snapshot = None
+            append_lines = []
+            for op, payload in items:
+                if op == 'compact':
+                    snapshot = payload
+                    append_lines = []  # superseded by the full snapshot
+                else:
+                    append_lines.extend(payload)
+            if snapshot is not None:
+                self._write_snapshot(snapshot)
+            if append_lines:
+                self._append_log(append_lines)
+
+    def _append_log(self, lines):
+        dir_path = os.path.dirname(self.jobs_log_file)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        with open(self.jobs_log_file, 'ab') as f:
+            f.write(b''.join(lines))
+
+    def _write_snapshot(self, item):
+        jobs, index = item
         dir_path = os.path.dirname(self.jobs_file)
         if dir_path:
             os.makedirs(dir_path, exist_ok=True)
-        with open(self.jobs_file, 'w') as f:
-            json.dump(jobs, f, indent=2)
+
+        # Compact JSON: the metadata is machine-read, and indented output is
+        # several times larger and slower to serialize on every flush.
+        # os.replace keeps the files whole if we crash mid-write.
+        tmp_path = self.jobs_file + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json_dumps_bytes(jobs))
+        os.replace(tmp_path, self.jobs_file)
+
+        tmp_path = self.jobs_index_file + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json_dumps_bytes(index))
+        os.replace(tmp_path, self.jobs_index_file)
+
+        # The snapshot now covers everything in the journal
+        open(self.jobs_log_file, 'wb').close()
 
     def submit_batch(self, model_key: str, payloads: List[Dict], output_dir: str):
         """
@@ -62,116 +496,211 @@ class BatchManager:
         
         print(f"Submitting batch for {model_key} ({provider})...")
 
-        if provider == "openai": 
-            return self._submit_openai(model_key, model_name, payloads, output_dir)
+        # Submit each distinct prompt once; responses are fanned back out to
+        # every original id when results are processed.
+        payloads = self._dedup_payloads(model_key, payloads, output_dir)
+
+        limiter = self._limiters.get(provider)
+        if limiter is not None:
+            limiter.acquire()
+
+        if provider == "openai":
+            result = self._submit_openai(model_key, model_name, payloads, output_dir)
         elif provider == "anthropic":
-            return self._submit_anthropic(model_key, model_name, payloads, output_dir)
-        
+            result = self._submit_anthropic(model_key, model_name, payloads, output_dir)
+
         elif provider == "google":
-            return self._submit_google(model_key, model_name, payloads, output_dir)
-        
+            result = self._submit_google(model_key, model_name, payloads, output_dir)
+
+        elif provider == "openai_compatible":
+            result = self._submit_openai_compatible(model_key, model_name, payloads, output_dir, model_config)
+
         else:
             print(f"Batch submission not yet implemented for provider: {provider}")
             return None
 
-    def _submit_openai(self, model_key, model_name, payloads, output_dir):
-        # 1. Create JSONL file
+        self.flush_jobs()
+        return result
+
+    def _dedup_payloads(self, model_key, payloads, output_dir):
+        """
+        Collapses payloads with identical (system_prompt, user_query) pairs so
+        duplicates are only uploaded and billed once. When duplicates exist,
+        a canonical id -> [all ids] map is written to dedup_{model_key}.json
+        next to the batch input so result processing can fan responses back
+        out to every original id. Small runs are submitted as-is.
+        """
+        if len(payloads) < DEDUP_MIN_PAYLOADS:
+            return payloads
+
+        groups = {}
+        unique = []
+        for p in payloads:
+            key = hashlib.blake2b(
+                (p['system_prompt'] + '\x00' + p['user_query']).encode(),
+                digest_size=16
+            ).hexdigest()
+            if key in groups:
+                groups[key].append(str(p['id']))
+            else:
+                groups[key] = [str(p['id'])]
+                unique.append(p)
+
+        alias_map = {ids[0]: ids for ids in groups.values() if len(ids) > 1}
+        if alias_map:
+            sidecar_path = os.path.join(output_dir, f"dedup_{model_key}.json")
+            with open(sidecar_path, 'wb') as f:
+                f.write(json_dumps_bytes(alias_map, indent=True))
+            print(f"Deduplicated payloads: {len(unique)} unique of {len(payloads)}.")
+        return unique
+
+    def _load_alias_map(self, job):
+        sidecar_path = os.path.join(job['output_dir'], f"dedup_{job['model_key']}.json")
+        if os.path.exists(sidecar_path):
+            with open(sidecar_path, 'rb') as f:
+                return json_loads(f.read())
+        return {}
+
+    def _submit_openai(self, model_key, model_name, payloads, output_dir,
+                       client=None, provider="openai", extra_job=None):
+        client = client or self.openai_client
+
+        # 1. Create JSONL file. Plain bytes only: the Files API validates
+        # batch uploads as JSONL and rejects compressed content.
         jsonl_path = os.path.join(output_dir, f"batch_input_{model_key}.jsonl")
-        
-        with jsonlines.open(jsonl_path, mode='w') as writer:
-            for p in payloads:
-                # OpenAI Batch Format
-                request_obj = {
-                    "custom_id": str(p['id']),
-                    "method": "POST",
-                    "url": "/v1/chat/completions",
-                    "body": {
-                        "model": model_name,
-                        "messages": [
-                            {"role": "system", "content": p['system_prompt']},
-                            {"role": "user", "content": p['user_query']}
-                        ],
-                        "temperature": 0
-                    }
+        writer = open(jsonl_path, 'wb', buffering=256 * 1024)
+
+        # OpenAI Batch Format
+        def _request_obj(p):
+            return {
+                "custom_id": str(p['id']),
+                "method": "POST",
+                "url": OPENAI_BATCH_ENDPOINT,
+                "body": {
+                    "model": model_name,
+                    "messages": [
+                        {"role": "system", "content": p['system_prompt']},
+                        {"role": "user", "content": p['user_query']}
+                    ],
+                    "temperature": 0
                 }
-                writer.write(request_obj)
-        
-        # 2. Upload File
-        with open(jsonl_path, "rb") as f:
-            file_response = self.openai_client.files.create(file=f, purpose="batch")
-        
+            }
+
+        # Join all records and write once: a single bulk write instead of
+        # per-record write calls and their attribute-lookup overhead.
+        with writer as f:
+            if payloads:
+                f.write(b'\n'.join(json_dumps_bytes(_request_obj(p)) for p in payloads) + b'\n')
+
+        # 2. Upload File (re-opened per attempt so retries start from byte 0)
+        def _upload():
+            with open(jsonl_path, "rb") as f:
+                return client.files.create(file=f, purpose="batch")
+
+        file_response = self._with_retries(_upload, "OpenAI file upload")
         file_id = file_response.id
         print(f"Uploaded file {file_id}")
 
         # 3. Create Batch
-        batch_response = self.openai_client.batches.create(
-            input_file_id=file_id,
-            endpoint="/v1/chat/completions",
-            completion_window="24h"
+        batch_response = self._with_retries(
+            lambda: client.batches.create(
+                input_file_id=file_id,
+                endpoint=OPENAI_BATCH_ENDPOINT,
+                completion_window="24h"
+            ),
+            "OpenAI batch create"
         )
         
         batch_id = batch_response.id
         print(f"Batch submitted: {batch_id}")
 
         # 4. Record Job
-        jobs = self.load_jobs()
-        jobs[batch_id] = {
-            "provider": "openai",
+        job = {
+            "provider": provider,
             "model_key": model_key,
             "status": "pending",
             "timestamp": datetime.datetime.now().isoformat(),
             "output_dir": output_dir,
             "input_file": jsonl_path
         }
-        self.save_jobs(jobs)
+        if extra_job:
+            job.update(extra_job)
+        self.jobs[batch_id] = job
+        self._jobs_dirty = True
         return batch_id
 
     def _submit_openai_compatible(self, model_key, model_name, payloads, output_dir, model_config):
         """
-        Special handler for compatible APIs (like Qwen/DashScope using OpenAI SDK)
+        Special handler for compatible APIs (like Qwen/DashScope using OpenAI SDK).
+        Uses a cached client per (env_key, base_url) so repeated submissions and
+        polls share one warm connection pool, and records the connection info on
+        the job so the check path can rebuild the same client.
         """
-        pass
+        env_key = model_config.get('env_key')
+        base_url = model_config.get('base_url')
+        client = self._get_compat_client(env_key, base_url)
+        return self._submit_openai(
+            model_key, model_name, payloads, output_dir,
+            client=client, provider="openai_compatible",
+            extra_job={"env_key": env_key, "base_url": base_url}
+        )
 
     def _submit_google(self, model_key, model_name, payloads, output_dir):
         # 1. Create Gemini JSONL
         jsonl_path = os.path.join(output_dir, f"batch_input_{model_key}.jsonl")
         
-        with jsonlines.open(jsonl_path, mode='w') as writer:
-            for p in payloads:
+        # The system prompt is normally identical for every payload, so build
+        # the "System: ...\n\nUser: " prefix once instead of re-formatting the
+        # (potentially very large) prompt text per record.
+        common_system = payloads[0]['system_prompt'] if payloads else ""
+        shared_prefix = f"System: {common_system}\n\nUser: "
+
+        def _request_obj(p):
+            if p['system_prompt'] == common_system:
+                full_text = shared_prefix + p['user_query']
+            else:
                 full_text = f"System: {p['system_prompt']}\n\nUser: {p['user_query']}"
-                
-                request_obj = {
-                    "custom_id": str(p['id']),
-                    "method": "generateContent",
-                    "request": {
-                        "contents": [
-                            {"parts": [{"text": full_text}]}
-                        ]
-                    }
+
+            return {
+                "custom_id": str(p['id']),
+                "method": "generateContent",
+                "request": {
+                    "contents": [
+                        {"parts": [{"text": full_text}]}
+                    ]
                 }
-                writer.write(request_obj)
-        
+            }
+
+        with open(jsonl_path, 'wb', buffering=256 * 1024) as f:
+            if payloads:
+                f.write(b'\n'.join(json_dumps_bytes(_request_obj(p)) for p in payloads) + b'\n')
+
         print(f"Created Gemini input file {jsonl_path}")
 
         # 2. Upload File
-        uploaded_file = self.google_client.files.upload(
-            file=jsonl_path,
-            config=types.UploadFileConfig(display_name=f"batch_input_{model_key}", mime_type="application/json")
+        uploaded_file = self._with_retries(
+            lambda: self.google_client.files.upload(
+                file=jsonl_path,
+                config=types.UploadFileConfig(display_name=f"batch_input_{model_key}", mime_type="application/json")
+            ),
+            "Gemini file upload"
         )
         print(f"Uploaded file uri: {uploaded_file.uri}")
-        
+
         # 3. Submit Batch
-        batch_job = self.google_client.batches.create(
-            model=model_name,
-            src=uploaded_file.name,
-            config={'display_name': f"batch_run_{model_key}"}
+        batch_job = self._with_retries(
+            lambda: self.google_client.batches.create(
+                model=model_name,
+                src=uploaded_file.name,
+                config={'display_name': f"batch_run_{model_key}"}
+            ),
+            "Gemini batch create"
         )
         
         batch_id = batch_job.name
         print(f"Batch submitted: {batch_id}")
         
-        jobs = self.load_jobs()
-        jobs[batch_id] = {
+        self.jobs[batch_id] = {
             "provider": "google",
             "model_key": model_key,
             "status": "pending",
@@ -179,7 +708,7 @@ class BatchManager:
             "output_dir": output_dir,
             "input_file": jsonl_path
         }
-        self.save_jobs(jobs)
+        self._jobs_dirty = True
         return batch_id
 
     def _submit_anthropic(self, model_key, model_name, payloads, output_dir):
@@ -197,107 +726,190 @@ class BatchManager:
                 }
             })
         
-        batch = self.anthropic_client.messages.batches.create(
-            requests=requests
-        )
-        
-        print(f"Batch submitted: {batch.id}")
-        
-        jobs = self.load_jobs()
-        jobs[batch.id] = {
-            "provider": "anthropic",
-            "model_key": model_key,
-            "status": "pending",
-            "timestamp": datetime.datetime.now().isoformat(),
-            "output_dir": output_dir
-        }
-        self.save_jobs(jobs)
-        if not HAS_GOOGLE:
-             print("Error: google-genai package not installed, cannot submit Gemini batch.")
-             return None
-             
-        return batch.id
+        # Page the requests to stay under the per-batch API limit
+        batch_ids = []
+        num_pages = (len(requests) + ANTHROPIC_MAX_BATCH_REQUESTS - 1) // ANTHROPIC_MAX_BATCH_REQUESTS
+        for page, start in enumerate(range(0, len(requests), ANTHROPIC_MAX_BATCH_REQUESTS), start=1):
+            chunk = requests[start:start + ANTHROPIC_MAX_BATCH_REQUESTS]
+            batch = self._with_retries(
+                lambda c=chunk: self.anthropic_client.messages.batches.create(requests=c),
+                "Anthropic batch create"
+            )
+            print(f"Batch submitted: {batch.id} ({len(chunk)} requests)")
+
+            job = {
+                "provider": "anthropic",
+                "model_key": model_key,
+                "status": "pending",
+                "timestamp": datetime.datetime.now().isoformat(),
+                "output_dir": output_dir
+            }
+            # Pages share an output_dir, so give each its own summary file
+            # rather than letting later pages overwrite results_summary.json
+            if num_pages > 1:
+                job["summary_file"] = f"results_summary_page{page}.json"
+            self.jobs[batch.id] = job
+            batch_ids.append(batch.id)
+
+        self._jobs_dirty = True
+        # Single page (the usual case) returns a plain batch id like the
+        # other _submit_* methods; only a paged submission returns the list
+        return batch_ids[0] if len(batch_ids) == 1 else batch_ids
 
     def check_and_retrieve(self):
-        jobs = self.load_jobs()
-        
-        for batch_id, job in jobs.items():
-            if job.get('status') == 'completed':
-                continue
-            
-            provider = job['provider']
-            print(f"Checking {batch_id} ({provider})...")
-            
-            try:
-                if provider == "openai":
-                    self._check_openai(batch_id, job, jobs)
-                elif provider == "anthropic":
-                    self._check_anthropic(batch_id, job, jobs)
-                elif provider == "google":
-                    self._check_google(batch_id, job, jobs)
-            except Exception as e:
+        jobs = self.jobs
+
+        pending = [(batch_id, jobs[batch_id]) for batch_id in self.jobs_index['pending']
+                   if batch_id in jobs]
+
+        if pending:
+            # The status checks are independent network round-trips, so we fire
+            # them all concurrently instead of waiting on each one in turn.
+            asyncio.run(self._check_all(pending, jobs))
+            self._jobs_dirty = True
+
+        self.flush_jobs()
+
+    async def _check_all(self, pending, jobs):
+        checkers = {
+            "openai": self._check_openai,
+            "anthropic": self._check_anthropic,
+            "google": self._check_google,
+            "openai_compatible": self._check_openai_compatible
+        }
+        # Bound the fan-out so a large backlog of jobs doesn't burst past
+        # provider rate limits in a single poll cycle.
+        max_checks = self.config.get('batch', {}).get('max_concurrent_checks', 8)
+        sem = asyncio.Semaphore(min(max_checks, len(pending)))
+        # Separate, tighter bound for Anthropic result downloads: several
+        # batches ending in the same poll cycle stream concurrently, but
+        # never more than the provider's concurrency cap allows.
+        self._anthropic_dl_sem = asyncio.Semaphore(ANTHROPIC_MAX_CONCURRENT_DOWNLOADS)
+        tasks = [self._check_one(sem, checkers.get(job['provider']), batch_id, job, jobs)
+                 for batch_id, job in pending]
+        try:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            await self._close_async_clients()
+
+    async def _check_one(self, sem, checker, batch_id, job, jobs_dict):
+        provider = job['provider']
+        print(f"Checking {batch_id} ({provider})...")
+
+        if checker is None:
+            print(f"  No status checker for provider: {provider}")
+            return
+
+        try:
+            async with sem:
+                await checker(batch_id, job, jobs_dict)
+        except Exception as e:
+            if _is_transient_error(e):
                 print(f"Error checking status for {batch_id}: {e}")
-        
-        self.save_jobs(jobs)
+            else:
+                # A stale id (404 from a crashed earlier run) or a key/org
+                # mismatch fails identically on every cycle, so record it as
+                # terminal instead of re-polling the job forever
+                job['status'] = "failed"
+                job['error'] = str(e)
+                print(f"Marking {batch_id} failed; non-transient error: {e}")
 
-    def _check_openai(self, batch_id, job, jobs_dict):
-        batch = self.openai_client.batches.retrieve(batch_id)
+    async def _check_openai(self, batch_id, job, jobs_dict, client=None):
+        client = client or self._get_async_client('openai')
+        batch = await self._with_retries_async(
+            lambda: client.batches.retrieve(batch_id),
+            "OpenAI batch retrieve"
+        )
         current_status = batch.status
         print(f"  Status: {current_status}")
         
-        if current_status == "completed" and batch.output_file_id:
-            file_response = self.openai_client.files.content(batch.output_file_id)
-            content = file_response.text
-            
+        if current_status == "completed":
+            if not batch.output_file_id:
+                # Every request errored: there is only an error file, so the
+                # job is terminal with nothing to process
+                job['status'] = "failed"
+                if getattr(batch, 'error_file_id', None):
+                    job['error_file_id'] = batch.error_file_id
+                print(f"  Batch {batch_id} completed with no output file (all requests failed)")
+                return
+
             output_path = os.path.join(job['output_dir'], f"batch_results_{batch_id}.jsonl")
-            with open(output_path, "w") as f:
-                f.write(content)
-            
+
+            # Stream the result file to disk in chunks instead of holding the
+            # whole batch output (potentially 100s of MB) in memory at once.
+            with open(output_path, "wb", buffering=256 * 1024) as f:
+                async with client.files.with_streaming_response.content(
+                    batch.output_file_id
+                ) as file_response:
+                    async for chunk in file_response.iter_bytes(chunk_size=1 << 20):
+                        f.write(chunk)
+
+
             job['status'] = "completed"
             job['result_file'] = output_path
             print(f"  Downloaded results to {output_path}")
+        elif current_status in ("failed", "expired", "cancelled"):
+            # Record terminal failures so the job leaves the pending index
+            # instead of being polled forever
+            job['status'] = current_status
+            print(f"  Batch {batch_id} ended as {current_status}")
+
+    async def _check_openai_compatible(self, batch_id, job, jobs_dict):
+        client = self._get_async_client('openai_compatible', job['env_key'], job['base_url'])
+        await self._check_openai(batch_id, job, jobs_dict, client=client)
 
-    def _check_google(self, batch_id, job, jobs_dict):
-        batch_job = self.google_client.batches.get(name=batch_id)
+    async def _check_google(self, batch_id, job, jobs_dict):
+        client = self._get_async_client('google')
+        batch_job = await self._with_retries_async(
+            lambda: client.aio.batches.get(name=batch_id),
+            "Gemini batch get"
+        )
         state = batch_job.state.name
         print(f"  Status: {state}")
-        
+
         if state == "JOB_STATE_SUCCEEDED":
             output_file_name = batch_job.dest.file_name
             print(f"  Downloading from {output_file_name}")
-            content = self.google_client.files.download(file=output_file_name)
+            content = await client.aio.files.download(file=output_file_name)
             
             # Sanitize batch_id for filesystem (Gemini IDs contain '/')
             safe_batch_id = batch_id.replace("/", "_")
             output_path = os.path.join(job['output_dir'], f"batch_results_{safe_batch_id}.jsonl")
-            with open(output_path, "wb") as f:
+            with open(output_path, "wb", buffering=256 * 1024) as f:
                 f.write(content)
-                
+
             job['status'] = "completed"
             job['result_file'] = output_path
             print(f"  Downloaded results to {output_path}")
-    
-    def _check_anthropic(self, batch_id, job, jobs_dict):
-        batch = self.anthropic_client.messages.batches.retrieve(batch_id)
+        elif state in ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"):
+            job['status'] = "failed"
+            print(f"  Batch {batch_id} ended as {state}")
+
+    async def _check_anthropic(self, batch_id, job, jobs_dict):
+        client = self._get_async_client('anthropic')
+        batch = await self._with_retries_async(
+            lambda: client.messages.batches.retrieve(batch_id),
+            "Anthropic batch retrieve"
+        )
         current_status = batch.processing_status
         print(f"  Status: {current_status}")
-        
+
         if current_status == "ended":
-             # Iterating over results
-             results = []
+             output_path = os.path.join(job['output_dir'], f"batch_results_{batch_id}.jsonl")
+
+             # Stream each result straight to disk as it arrives, so peak
+             # memory stays at the write buffer instead of the whole batch.
              try:
-                 for result in self.anthropic_client.messages.batches.results(batch_id):
-                     results.append(result.to_dict()) # Ensure dict serializable
+                 async with self._anthropic_dl_sem:
+                     with open(output_path, "wb", buffering=256 * 1024) as f:
+                         async for result in await client.messages.batches.results(batch_id):
+                             # model_dump_json serializes in pydantic's native
+                             # core, skipping the intermediate to_dict() tree walk
+                             f.write(result.model_dump_json().encode() + b"\n")
              except Exception as e:
                  print(f"Error fetching Anthropic results: {e}")
-                 # Try simple list fallback if SDK allows
-                 pass
+                 return
 
-             output_path = os.path.join(job['output_dir'], f"batch_results_{batch_id}.jsonl")
-             with open(output_path, "w") as f:
-                 for r in results:
-                     f.write(json.dumps(r) + "\n")
-            
              job['status'] = "completed"
              job['result_file'] = output_path
              print(f"  Downloaded results to {output_path}")
@@ -307,101 +919,122 @@ class BatchManager:
         Processes completed batch jobs and converts their raw output 
         to the standard results_summary.json format used by the Evaluator.
         """
-        jobs = self.load_jobs()
+        jobs = self.jobs
+
+        # Pre-filter so the warm case (everything already processed) does no
+        # per-batch work at all, not even building the query lookup.
+        todo = [
+            (batch_id, jobs[batch_id])
+            for batch_id in self.jobs_index['unprocessed']
+            if batch_id in jobs
+            and not jobs[batch_id].get('results_processed')
+            and jobs[batch_id].get('result_file')
+        ]
+        if not todo:
+            print("No new completed batches to process.")
+            return
+        print(f"Processing {len(todo)} new batches; skipping {len(jobs) - len(todo)} already done.")
+
         processed_count = 0
-        
-        for batch_id, job in jobs.items():
-            if job.get('status') == 'completed' and not job.get('results_processed'):
-                print(f"Processing results for batch {batch_id}...")
-                
-                result_file = job.get('result_file')
-                if not result_file or not os.path.exists(result_file):
-                    print(f"  Result file missing: {result_file}")
-                    continue
-                    
-                model_key = job['model_key']
-                output_dir = job['output_dir']
-                
-                query_map = {str(q['id']): q for q in evaluator.queries}
-                
-                results = []
-                logs_path = os.path.join(output_dir, "detailed_logs.jsonl")
-                
-                with jsonlines.open(result_file) as reader:
-                    for line in reader:
-                        provider = job['provider']
-                        custom_id = None
-                        response_text = ""
-                        
-                        try:
-                            if provider in ["openai"]:
-                                custom_id = line.get('custom_id')
-                                choice = line.get('response', {}).get('body', {}).get('choices', [{}])[0]
-                                response_text = choice.get('message', {}).get('content', "")
-                            elif provider == "anthropic":
-                                custom_id = line.get('custom_id')
-                                result = line.get('result', {})
-                                if result.get('type') == 'succeeded':
-                                    content_list = result.get('message', {}).get('content', [])
-                                    if content_list:
-                                        response_text = content_list[0].get('text', "")
-                            elif provider == "google":
-                                custom_id = line.get('custom_id') 
-                                # Gemini Batch Output often matches input structure or uses custom_id if provided 
-                                # In the newest API, check 'custom_id' field.
-                                if not custom_id and 'request' in line:
-                                     # Sometimes it echoes request
-                                     pass
-                                # Response part
-                                try:
-                                    response_text = line['response']['candidates'][0]['content']['parts'][0]['text']
-                                except:
-                                    pass
-
-                        except Exception as e:
-                            print(f"  Error parsing line: {e}")
-                            continue
 
-                        if custom_id and custom_id in query_map:
-                            item = query_map[custom_id]
-                            nl_query = item['query']
-                            generated_sparql = evaluator.clean_sparql(response_text)
-                            
-                            # Log
-                            log_entry = {
-                                "id": custom_id,
-                                "timestamp": datetime.datetime.now().isoformat(),
-                                "model": model_key,
-                                "user_query": nl_query,
-                                "full_response": response_text,
-                                "extracted_sparql": generated_sparql
-                            }
-                            with open(logs_path, "a") as f:
-                                f.write(json.dumps(log_entry) + "\n")
-                                
-                            result_record = {
-                                "id": custom_id,
-                                "query": nl_query,
-                                "model": model_key,
-                                "generated_sparql": generated_sparql,
-                                "ground_truth_sparql": item.get('ground_truth_sparql'),
-                                "generated_count": -1,
-                                "ground_truth_count": -1,
-                                "is_match": False,
-                                "execution_error": "Execution Skipped (Batch Mode)",
-                                "raw_llm_response": response_text
-                            }
-                            results.append(result_record)
-                
-                summary_path = os.path.join(output_dir, "results_summary.json")
-                with open(summary_path, 'w') as f:
-                    json.dump(results, f, indent=2)
-                
-                job['results_processed'] = True
-                processed_count += 1
-                
+        # Built once: the same lookup serves every completed batch
+        query_map = {str(q['id']): q for q in evaluator.queries}
+
+        for batch_id, job in todo:
+            print(f"Processing results for batch {batch_id}...")
+
+            result_file = job['result_file']
+
+            # One open() instead of an exists() stat plus open(); a
+            # missing file just raises rather than racing the check.
+            try:
+                result_fh = open(result_file, 'rb', buffering=256 * 1024)
+            except FileNotFoundError:
+                print(f"  Result file missing: {result_file}")
+                continue
+
+            output_dir = job['output_dir']
+
+            logs_path = os.path.join(output_dir, "detailed_logs.jsonl")
+            summary_path = os.path.join(output_dir, job.get('summary_file', "results_summary.json"))
+
+            # Open the log once for the whole batch instead of an
+            # open/write/close round-trip per parsed result line; the
+            # summary records are streamed out as they are produced.
+            logs_fh = open(logs_path, "ab", buffering=256 * 1024)
+            summary_fh = open(summary_path, 'wb', buffering=256 * 1024)
+            try:
+                record_writer = _JsonArrayWriter(summary_fh)
+                self._parse_result_lines(job, result_fh, query_map, logs_fh, record_writer, evaluator)
+                record_writer.close()
+            finally:
+                logs_fh.close()
+                summary_fh.close()
+                result_fh.close()
+
+            job['results_processed'] = True
+            processed_count += 1
+
         if processed_count > 0:
-            self.save_jobs(jobs)
+            self._jobs_dirty = True
+            self.flush_jobs()
             print(f"Processed {processed_count} completed batches.")
-        else:
-            print("No new completed batches to process.")
+
+    def _parse_result_lines(self, job, result_fh, query_map, logs_fh, record_writer, evaluator):
+        model_key = job['model_key']
+        parse_line = _LINE_PARSERS.get(job['provider'])
+        if parse_line is None:
+            print(f"  No result parser for provider: {job['provider']}")
+            return
+
+        # canonical id -> all ids that shared that prompt at submission time
+        alias_map = self._load_alias_map(job)
+
+        # One timestamp for the whole batch: every row "happened" at batch
+        # completion, and now().isoformat() is too expensive for the hot loop.
+        batch_ts = datetime.datetime.now().isoformat()
+
+        for line in _iter_result_lines(result_fh):
+            try:
+                custom_id, response_text = parse_line(line)
+            except (KeyError, IndexError, TypeError, AttributeError) as e:
+                print(f"  Error parsing line: {e}")
+                continue
+
+            if not custom_id:
+                continue
+
+            generated_sparql = evaluator.clean_sparql(response_text)
+
+            # Fan the response out to every id that was deduplicated onto
+            # this custom_id (just the id itself when there were no dupes).
+            for record_id in alias_map.get(custom_id, (custom_id,)):
+                if record_id not in query_map:
+                    continue
+                item = query_map[record_id]
+                nl_query = item['query']
+
+                # Log
+                log_entry = {
+                    "id": record_id,
+                    "timestamp": batch_ts,
+                    "model": model_key,
+                    "user_query": nl_query,
+                    "full_response": response_text,
+                    "extracted_sparql": generated_sparql
+                }
+                logs_fh.write(json_dumps_bytes(log_entry) + b"\n")
+
+                result_record = {
+                    "id": record_id,
+                    "query": nl_query,
+                    "model": model_key,
+                    "generated_sparql": generated_sparql,
+                    "ground_truth_sparql": item.get('ground_truth_sparql'),
+                    "generated_count": -1,
+                    "ground_truth_count": -1,
+                    "is_match": False,
+                    "execution_error": "Execution Skipped (Batch Mode)",
+                    "raw_llm_response": response_text
+                }
+                record_writer.write(result_record)
@@ -1,23 +1,258 @@
 import os
-import openai
-import anthropic
-# import google.generativeai as genai # Deprecated
-from google import genai 
+import time
+import random
+import asyncio
+import weakref
+import threading
+import contextvars
 from typing import Optional
 
+# Provider SDKs (openai, anthropic, google-genai) are imported lazily in
+# _get_client: each drags in heavy transitive imports, and a run against one
+# provider should not pay the startup cost of the other two.
+
+from src.response_cache import ResponseCache
+
+# Per-task so concurrent async calls don't clobber each other's usage
+_last_usage = contextvars.ContextVar('llm_last_usage', default=None)
+
+MAX_RETRIES = 5
+MAX_RETRY_DELAY = 30.0
+# Gemini context-cache lifetime, and how long before expiry we stop using a
+# handle: sending a dead cached_content reference is a hard (non-retried)
+# error, so recreate with margin to spare.
+GOOGLE_CACHE_TTL_SECONDS = 3600
+GOOGLE_CACHE_REFRESH_MARGIN = 300
+# Consecutive final failures before a provider's circuit opens, and how
+# long it stays open before calls are attempted again
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60.0
+
+def _is_transient_error(e):
+    """True for rate limits, timeouts and 5xx - worth retrying."""
+    status = getattr(e, 'status_code', None)
+    if status is None:
+        response = getattr(e, 'response', None)
+        status = getattr(response, 'status_code', None)
+    if status in (408, 429, 500, 502, 503, 504):
+        return True
+    name = type(e).__name__
+    return any(token in name for token in
+               ('Timeout', 'Connection', 'RateLimit', 'ServiceUnavailable', 'InternalServer'))
+
+def _retry_delay(attempt):
+    # Exponential backoff with jitter so retries don't re-synchronize
+    return min(MAX_RETRY_DELAY, 2 ** (attempt - 1)) * (0.5 + random.random())
+
 class LLMManager:
     def __init__(self, config):
         self.config = config
+        # Optional exact-match response cache, enabled via config path
+        cache_path = config.get('evaluation', {}).get('response_cache_file')
+        self.response_cache = ResponseCache(cache_path) if cache_path else None
         self.setup_clients()
 
+    def _cache_key(self, model_key, prompt, system_prompt):
+        if self.response_cache is None:
+            return None
+        return ResponseCache.make_key(model_key, system_prompt, prompt)
+
+    def _cache_put(self, key, response):
+        # Never cache transport failures; they are the provider error strings
+        if key is not None and response and not response.startswith("Error calling"):
+            self.response_cache.put(key, response)
+
+    def last_usage(self):
+        """Token usage reported by the most recent call in the current task."""
+        return _last_usage.get()
+
     def setup_clients(self):
-        # We initialize clients on demand or upfront based on available keys
-        pass
+        # Clients are built on first use and cached; constructing one per
+        # call would open a fresh TLS connection and HTTPX pool per query.
+        self._clients = {}
+        # Async clients and cache locks are scoped to their event loop. Weak
+        # keys on the loop object (rather than id(loop), which a later loop
+        # can reuse once the first is collected) make a finished loop's
+        # entries vanish instead of being handed to its successor.
+        self._loop_clients = weakref.WeakKeyDictionary()
+        self._google_cache_locks = weakref.WeakKeyDictionary()
+        # Gemini explicit context caches, keyed by (model, system prompt):
+        # the ontology-bearing system prompt is uploaded once and referenced
+        # by handle instead of resent inline with every request.
+        self._google_caches = {}
+        # Circuit breakers: endpoint -> [consecutive failures, open-until]
+        self._breakers = {}
+        self._breaker_lock = threading.Lock()
 
-    def get_response(self, model_key: str, prompt: str, system_prompt: str = "") -> str:
+    def _breaker_check(self, endpoint):
+        """Raises immediately while the endpoint's circuit is open."""
+        with self._breaker_lock:
+            state = self._breakers.get(endpoint)
+            if state and time.monotonic() < state[1]:
+                raise RuntimeError(
+                    f"circuit open for {endpoint} after {state[0]} consecutive failures; "
+                    f"skipping call"
+                )
+
+    def _breaker_record(self, endpoint, success):
+        with self._breaker_lock:
+            if success:
+                self._breakers.pop(endpoint, None)
+                return
+            state = self._breakers.setdefault(endpoint, [0, 0.0])
+            state[0] += 1
+            if state[0] >= BREAKER_THRESHOLD:
+                state[1] = time.monotonic() + BREAKER_COOLDOWN
+                print(f"Circuit opened for {endpoint} for {BREAKER_COOLDOWN:.0f}s")
+
+    def _with_retries(self, endpoint, call):
         """
-        Dispatches the request to the appropriate provider based on the configuration for 'model_key'.
+        Runs a provider call with jittered exponential backoff on transient
+        failures, feeding the endpoint's circuit breaker. A string error
+        result used to be the only outcome of a 429; now the request is
+        retried before the failure is surfaced.
+        """
+        self._breaker_check(endpoint)
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                result = call()
+            except Exception as e:
+                if attempt == MAX_RETRIES or not _is_transient_error(e):
+                    self._breaker_record(endpoint, success=False)
+                    raise
+                time.sleep(_retry_delay(attempt))
+            else:
+                self._breaker_record(endpoint, success=True)
+                return result
+
+    async def _with_retries_async(self, endpoint, call):
+        """Async twin of _with_retries."""
+        self._breaker_check(endpoint)
+        for attempt in range(1, MAX_RETRIES + 1):
+            try:
+                result = await call()
+            except Exception as e:
+                if attempt == MAX_RETRIES or not _is_transient_error(e):
+                    self._breaker_record(endpoint, success=False)
+                    raise
+                await asyncio.sleep(_retry_delay(attempt))
+            else:
+                self._breaker_record(endpoint, success=True)
+                return result
+
+    def _google_cache_lock(self):
+        # One lock per event loop so a burst of concurrent first calls
+        # creates the context cache exactly once
+        loop = asyncio.get_running_loop()
+        lock = self._google_cache_locks.get(loop)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._google_cache_locks[loop] = lock
+        return lock
+
+    def _google_config(self, cache_name, system_prompt):
+        if cache_name:
+            return {'cached_content': cache_name, 'temperature': 0}
+        # Cache unavailable (small prompt, unsupported model, API error):
+        # fall back to sending the system prompt inline
+        return {'system_instruction': system_prompt, 'temperature': 0}
+
+    def _google_cache_entry(self, key):
+        """Returns (name, fresh): fresh is False once the TTL horizon nears."""
+        entry = self._google_caches.get(key)
+        if entry is None:
+            return None, False
+        name, refresh_at = entry
+        return name, time.monotonic() < refresh_at
+
+    def _store_google_cache(self, key, name):
+        refresh_at = time.monotonic() + GOOGLE_CACHE_TTL_SECONDS - GOOGLE_CACHE_REFRESH_MARGIN
+        self._google_caches[key] = (name, refresh_at)
+
+    def _get_google_cache(self, client, model, system_prompt):
+        key = (model, system_prompt)
+        name, fresh = self._google_cache_entry(key)
+        if not fresh:
+            try:
+                cache = client.caches.create(
+                    model=model,
+                    config={'system_instruction': system_prompt,
+                            'ttl': f'{GOOGLE_CACHE_TTL_SECONDS}s'}
+                )
+                name = cache.name
+            except Exception as e:
+                print(f"Gemini context cache unavailable, sending prompt inline: {e}")
+                name = None
+            self._store_google_cache(key, name)
+        return name
+
+    async def _get_google_cache_async(self, client, model, system_prompt):
+        key = (model, system_prompt)
+        name, fresh = self._google_cache_entry(key)
+        if not fresh:
+            async with self._google_cache_lock():
+                name, fresh = self._google_cache_entry(key)
+                if not fresh:
+                    try:
+                        cache = await client.aio.caches.create(
+                            model=model,
+                            config={'system_instruction': system_prompt,
+                                    'ttl': f'{GOOGLE_CACHE_TTL_SECONDS}s'}
+                        )
+                        name = cache.name
+                    except Exception as e:
+                        print(f"Gemini context cache unavailable, sending prompt inline: {e}")
+                        name = None
+                    self._store_google_cache(key, name)
+        return name
+
+    def _get_client(self, kind, api_key, base_url=None):
+        """
+        Returns a cached provider client for (kind, base_url, key). Async
+        clients live in a per-loop cache, since an httpx AsyncClient cannot
+        be reused across loops.
         """
+        if kind.endswith('_async'):
+            cache = self._loop_clients.setdefault(asyncio.get_running_loop(), {})
+        else:
+            cache = self._clients
+
+        key = (kind, base_url, api_key)
+        client = cache.get(key)
+        if client is None:
+            # Imports live here so only the SDKs actually used get loaded;
+            # they run once per constructed client and are cached with it
+            if kind in ('google', 'google_async'):
+                from google import genai
+                client = genai.Client(api_key=api_key)
+            else:
+                import httpx
+                limits = httpx.Limits(max_keepalive_connections=100, max_connections=200)
+                # max_retries=0: backoff and retries are handled in
+                # _with_retries, so SDK-level retries would compound
+                if kind == 'openai':
+                    import openai
+                    client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                           http_client=httpx.Client(limits=limits))
+                elif kind == 'openai_async':
+                    import openai
+                    client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0,
+                                                http_client=httpx.AsyncClient(limits=limits))
+                elif kind == 'anthropic':
+                    import anthropic
+                    client = anthropic.Anthropic(api_key=api_key, max_retries=0,
+                                                 http_client=httpx.Client(limits=limits))
+                elif kind == 'anthropic_async':
+                    import anthropic
+                    client = anthropic.AsyncAnthropic(api_key=api_key, max_retries=0,
+                                                      http_client=httpx.AsyncClient(limits=limits))
+                else:
+                    raise ValueError(f"Unknown client kind: {kind}")
+            cache[key] = client
+        return client
+
+    def _resolve_model(self, model_key: str):
+        """Shared dispatch lookup for the sync and async entry points."""
         model_config = self.config['models'].get(model_key)
         if not model_config:
             raise ValueError(f"Model configuration for '{model_key}' not found.")
@@ -32,23 +267,70 @@ class LLMManager:
             # But for now, let's raise error
             raise ValueError(f"API Key for {model_key} ({env_key}) not found in environment variables.")
 
+        return model_config, provider, model_name, api_key
+
+    def get_response(self, model_key: str, prompt: str, system_prompt: str = "") -> str:
+        """
+        Dispatches the request to the appropriate provider based on the configuration for 'model_key'.
+        """
+        model_config, provider, model_name, api_key = self._resolve_model(model_key)
+
+        cache_key = self._cache_key(model_key, prompt, system_prompt)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
         if provider == "openai":
-            return self._call_openai(api_key, model_name, prompt, system_prompt)
+            response = self._call_openai(api_key, model_name, prompt, system_prompt)
         elif provider == "anthropic":
-            return self._call_anthropic(api_key, model_name, prompt, system_prompt)
+            response = self._call_anthropic(api_key, model_name, prompt, system_prompt)
         elif provider == "google":
-            return self._call_google(api_key, model_name, prompt, system_prompt)
+            response = self._call_google(api_key, model_name, prompt, system_prompt)
         elif provider == "openai_compatible":
             base_url = model_config.get('base_url')
-            return self._call_openai(api_key, model_name, prompt, system_prompt, base_url=base_url)
+            response = self._call_openai(api_key, model_name, prompt, system_prompt, base_url=base_url)
         elif provider == "qwen":
             # Use OpenAI compatible client for Qwen
-            return self._call_openai(api_key, model_name, prompt, system_prompt, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+            response = self._call_openai(api_key, model_name, prompt, system_prompt, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
         else:
             raise ValueError(f"Unknown provider: {provider}")
 
+        self._cache_put(cache_key, response)
+        return response
+
+    async def get_response_async(self, model_key: str, prompt: str, system_prompt: str = "") -> str:
+        """
+        Async twin of get_response, for concurrent fan-out over many queries.
+        """
+        model_config, provider, model_name, api_key = self._resolve_model(model_key)
+
+        cache_key = self._cache_key(model_key, prompt, system_prompt)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        if provider == "openai":
+            response = await self._call_openai_async(api_key, model_name, prompt, system_prompt)
+        elif provider == "anthropic":
+            response = await self._call_anthropic_async(api_key, model_name, prompt, system_prompt)
+        elif provider == "google":
+            response = await self._call_google_async(api_key, model_name, prompt, system_prompt)
+        elif provider == "openai_compatible":
+            base_url = model_config.get('base_url')
+            response = await self._call_openai_async(api_key, model_name, prompt, system_prompt, base_url=base_url)
+        elif provider == "qwen":
+            # Use OpenAI compatible client for Qwen
+            response = await self._call_openai_async(api_key, model_name, prompt, system_prompt, base_url="https://dashscope.aliyuncs.com/compatible-mode/v1")
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+
+        self._cache_put(cache_key, response)
+        return response
+
     def _call_openai(self, api_key, model, prompt, system_prompt, base_url=None):
-        client = openai.OpenAI(api_key=api_key, base_url=base_url)
+        client = self._get_client('openai', api_key, base_url)
         
         messages = []
         if system_prompt:
@@ -56,28 +338,109 @@ class LLMManager:
         messages.append({"role": "user", "content": prompt})
 
         try:
-            response = client.chat.completions.create(
+            response = self._with_retries(base_url or 'openai', lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0
+            ))
+            self._record_openai_usage(response)
+            return response.choices[0].message.content
+        except Exception as e:
+            return f"Error calling OpenAI/Compatible: {e}"
+
+    async def _call_openai_async(self, api_key, model, prompt, system_prompt, base_url=None):
+        client = self._get_client('openai_async', api_key, base_url)
+
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+
+        try:
+            response = await self._with_retries_async(base_url or 'openai', lambda: client.chat.completions.create(
                 model=model,
                 messages=messages,
                 temperature=0
-            )
+            ))
+            self._record_openai_usage(response)
             return response.choices[0].message.content
         except Exception as e:
             return f"Error calling OpenAI/Compatible: {e}"
 
+    @staticmethod
+    def _record_openai_usage(response):
+        # cached_tokens > 0 confirms the automatic prefix cache is hitting
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            _last_usage.set({
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+                "cached_tokens": getattr(details, "cached_tokens", None)
+            })
+
+    @staticmethod
+    def _record_google_usage(response):
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            _last_usage.set({
+                "prompt_tokens": getattr(usage, "prompt_token_count", None),
+                "completion_tokens": getattr(usage, "candidates_token_count", None),
+                "cached_tokens": getattr(usage, "cached_content_token_count", None)
+            })
+
+    @staticmethod
+    def _anthropic_system_blocks(system_prompt):
+        # cache_control marks the (identical across queries) system prompt as
+        # a cacheable prefix: ~90% input-token cost reduction on cache hits
+        return [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
+
+    @staticmethod
+    def _record_anthropic_usage(response):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            _last_usage.set({
+                "input_tokens": getattr(usage, "input_tokens", None),
+                "output_tokens": getattr(usage, "output_tokens", None),
+                "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None),
+                "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None)
+            })
+
     def _call_anthropic(self, api_key, model, prompt, system_prompt):
-        client = anthropic.Anthropic(api_key=api_key)
-        
+        client = self._get_client('anthropic', api_key)
+
         try:
             # Anthropic handles system prompts as a separate parameter in newer APIs
-            response = client.messages.create(
+            response = self._with_retries('anthropic', lambda: client.messages.create(
+                model=model,
+                max_tokens=1024,
+                system=self._anthropic_system_blocks(system_prompt),
+                messages=[
+                    {"role": "user", "content": prompt}
+                ]
+            ))
+            self._record_anthropic_usage(response)
+            return response.content[0].text
+        except Exception as e:
+            return f"Error calling Anthropic: {e}"
+
+    async def _call_anthropic_async(self, api_key, model, prompt, system_prompt):
+        client = self._get_client('anthropic_async', api_key)
+
+        try:
+            response = await self._with_retries_async('anthropic', lambda: client.messages.create(
                 model=model,
                 max_tokens=1024,
-                system=system_prompt,
+                system=self._anthropic_system_blocks(system_prompt),
                 messages=[
                     {"role": "user", "content": prompt}
                 ]
-            )
+            ))
+            self._record_anthropic_usage(response)
             return response.content[0].text
         except Exception as e:
             return f"Error calling Anthropic: {e}"
@@ -85,21 +448,31 @@ class LLMManager:
     def _call_google(self, api_key, model, prompt, system_prompt):
         # Using new google.genai library
         try:
-            client = genai.Client(api_key=api_key)
-            
-            # Simple content generation
-            # Note: system instruction support in v1beta varies by signature
-            # We construct a combined prompt if system param isn't directly exposed in generate_content 
-            # effectively, or pass config.
-            
-            response = client.models.generate_content(
+            client = self._get_client('google', api_key)
+
+            cache_name = self._get_google_cache(client, model, system_prompt) if system_prompt else None
+            response = self._with_retries('google', lambda: client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=self._google_config(cache_name, system_prompt)
+            ))
+            self._record_google_usage(response)
+            return response.text
+        except Exception as e:
+            return f"Error calling Google: {e}"
+
+    async def _call_google_async(self, api_key, model, prompt, system_prompt):
+        try:
+            client = self._get_client('google_async', api_key)
+
+            cache_name = await self._get_google_cache_async(client, model, system_prompt) if system_prompt else None
+            # The .aio surface mirrors the sync models API
+            response = await self._with_retries_async('google', lambda: client.aio.models.generate_content(
                 model=model,
                 contents=prompt,
-                config={
-                   'system_instruction': system_prompt,
-                   'temperature': 0 
-                }
-            )
+                config=self._google_config(cache_name, system_prompt)
+            ))
+            self._record_google_usage(response)
             return response.text
         except Exception as e:
             return f"Error calling Google: {e}"
@@ -29,8 +29,11 @@ def main():
     if args.check_batch:
         from src.batch_manager import BatchManager
         bm = BatchManager(evaluator.config)
-        bm.check_and_retrieve()
-        bm.process_results_to_final_json(evaluator)
+        try:
+            bm.check_and_retrieve()
+            bm.process_results_to_final_json(evaluator)
+        finally:
+            bm.close()
         return
 
     if args.batch:
@@ -44,18 +47,21 @@ def main():
             models_to_run = evaluator.config['models'].keys()
 
         payloads = evaluator.generate_prompt_payloads()
-        
-        for model in models_to_run:
-            try:
-                 # Create output dir for this run
-                output_dir = evaluator.prepare_output_dir(model)
-                evaluator.save_run_metadata(output_dir, model)
-                
-                bm.submit_batch(model, payloads, output_dir)
-            except Exception as e:
-                print(f"FAILED to submit batch for {model}: {e}")
-                # Continue to next model
-        
+
+        try:
+            for model in models_to_run:
+                try:
+                     # Create output dir for this run
+                    output_dir = evaluator.prepare_output_dir(model)
+                    evaluator.save_run_metadata(output_dir, model)
+
+                    bm.submit_batch(model, payloads, output_dir)
+                except Exception as e:
+                    print(f"FAILED to submit batch for {model}: {e}")
+                    # Continue to next model
+        finally:
+            bm.close()
+
         return
 
     # Interactive Mode (Normal)
@@ -1,107 +1,116 @@
 import os
 import glob
 import re
+import shutil
+import hashlib
 
 def combine_ontologies(ontology_dir="ontologies", output_file="ontologies/combined.ttl", ignore_files=None):
     """
     Combines multiple Turtle (.ttl) ontology files into a single file.
     Extracts prefixes to the top and concatenates the rest of the content.
+
+    Two passes: the first collects @prefix declarations from every file,
+    the second streams the remaining content straight to the output file.
+    Nothing is accumulated in memory beyond the current line.
     """
     if ignore_files is None:
         ignore_files = ["ontology_Aug2025.ttl", "combined.ttl", "cantusdb.ttl", "rism.ttl", "cantusindex.ttl"]
 
     ttl_files = glob.glob(os.path.join(ontology_dir, "*.ttl"))
-    
+
+    # Sort files to ensure deterministic output order
+    source_files = [f for f in sorted(ttl_files)
+                    if os.path.basename(f) not in ignore_files]
+
     # Use a dict to store prefix -> url mapping for true deduplication
     prefix_map = {}
-    content_lines = []
-    
+
     # Regex to parse prefix lines: @prefix name: <url> .
     # Handles variable whitespace
     prefix_pattern = re.compile(r'@prefix\s+([\w-]+):\s+<([^>]+)>\s*\.')
 
     print(f"Found {len(ttl_files)} ontology files in {ontology_dir}")
 
-    # Process files
-    # Sort files to ensure deterministic output order
-    for file_path in sorted(ttl_files):
-        filename = os.path.basename(file_path)
-        if filename in ignore_files:
-            continue
-            
-        print(f"Processing {filename}...")
+    # Pass 1: prefixes only, so the header can be written before any content
+    for file_path in source_files:
         try:
             with open(file_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                
-                # 1. Clean up trailing newlines from previous content to ensure clean state
-                while content_lines and content_lines[-1].strip() == "":
-                    content_lines.pop()
-                
-                # 2. Add separation from previous content (if any)
-                if content_lines:
-                    # Ensure the last line ends with a newline before adding separator
-                    if not content_lines[-1].endswith("\n"):
-                        content_lines[-1] += "\n"
-                    content_lines.append("\n") # One empty line separator
-                
-                # 3. Add Header
-                content_lines.append(f"# --- Source: {filename} ---\n")
-                
-                # 4. Add separation after header
-                content_lines.append("\n") # One empty line separator
-                
-                start_doc = True
-                for line in lines:
+                for line in f:
                     stripped = line.strip()
                     match = prefix_pattern.match(stripped)
                     if match:
-                        p_name = match.group(1)
-                        p_url = match.group(2)
-                        prefix_map[p_name] = p_url
+                        prefix_map[match.group(1)] = match.group(2)
                     elif stripped.lower().startswith("@prefix"):
-                         print(f"Warning: Line looked like prefix but failed regex: {stripped}")
-                    elif stripped == "":
-                         if start_doc:
-                             continue # Skip leading blank lines in the file
-                         
-                         # Check if the previous line was also empty to avoid double newlines within files
-                         if content_lines and content_lines[-1].strip() == "":
-                             pass
-                         else:
-                             content_lines.append(line)
-                    else:
-                        start_doc = False # Found content
-                        content_lines.append(line)
+                        print(f"Warning: Line looked like prefix but failed regex: {stripped}")
         except Exception as e:
-            print(f"Error processing {filename}: {e}")
+            print(f"Error processing {os.path.basename(file_path)}: {e}")
 
-    # Write combined output
+    # Pass 2: stream content to a temp file, hashing as we go. The combined
+    # file feeds the prompt prefix, so its bytes must be fully deterministic
+    # for provider prompt caches: sorted sections, \n endings, no trailing
+    # whitespace, blank runs collapsed. The hash goes in a header comment so
+    # cache-busting changes are visible at a glance.
+    body_hash = hashlib.sha256()
+    tmp_path = output_file + ".tmp"
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
+        with open(tmp_path, "w", encoding="utf-8", newline="\n") as out:
+            def write(text):
+                body_hash.update(text.encode("utf-8"))
+                out.write(text)
+
             # Write prefixes first
-            f.write("# --- Prefixes ---\n")
+            write("# --- Prefixes ---\n")
             for p_name in sorted(prefix_map.keys()):
                 p_url = prefix_map[p_name]
-                f.write(f"@prefix {p_name}:\t<{p_url}> .\n")
-            
-            f.write("\n# --- Ontology Definitions ---\n\n")
-            
-            # Ensure we don't start with a blank line if we don't want to
-            # But the logic above might leave one leading newline if content_lines started empty?
-            # actually logic: `if content_lines: append('\n')` protects the very start.
-            # But the first file loop does: `if content_lines:` (false) -> `append header`.
-            # So the first file header starts immediately.
-            
-            for line in content_lines:
-                f.write(line)
-
-            # Since content_lines preserves newlines, we check the last one
-            if content_lines and not content_lines[-1].endswith('\n'):
-                 f.write('\n') # finish the last line if needed
-            
-            f.write('\nREMEMBER: Please find the correct QIDs')
-                
+                write(f"@prefix {p_name}:\t<{p_url}> .\n")
+
+            write("\n# --- Ontology Definitions ---\n\n")
+
+            first_file = True
+            for file_path in source_files:
+                filename = os.path.basename(file_path)
+                print(f"Processing {filename}...")
+
+                # One empty line between files, header before each
+                if not first_file:
+                    write("\n")
+                first_file = False
+                write(f"# --- Source: {filename} ---\n\n")
+
+                # Iterate the file directly (no readlines list) and hold
+                # blank lines back until content follows: runs collapse to
+                # one, and trailing blanks are simply never flushed.
+                blank_pending = False
+                wrote_any = False
+                try:
+                    with open(file_path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            stripped = line.strip()
+                            if stripped.lower().startswith("@prefix"):
+                                continue
+                            if stripped == "":
+                                blank_pending = wrote_any
+                                continue
+                            if blank_pending:
+                                write("\n")
+                                blank_pending = False
+                            # Normalize: no trailing whitespace, \n endings
+                            write(line.rstrip() + "\n")
+                            wrote_any = True
+                except Exception as e:
+                    print(f"Error processing {filename}: {e}")
+                    continue
+
+            write('\nREMEMBER: Please find the correct QIDs')
+
+        # Prepend the hash header, then swap the finished file into place
+        with open(output_file + ".new", "w", encoding="utf-8", newline="\n") as final:
+            final.write(f"# sha256: {body_hash.hexdigest()}\n")
+            with open(tmp_path, "r", encoding="utf-8") as body:
+                shutil.copyfileobj(body, final)
+        os.replace(output_file + ".new", output_file)
+        os.remove(tmp_path)
+
         print(f"Successfully created combined ontology at: {output_file}")
         return output_file
     except Exception as e:
@@ -0,0 +1,60 @@
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Evaluation reruns within a day should hit the cache; anything older is
+# likely a changed prompt/ontology anyway
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+class ResponseCache:
+    """
+    Exact-match cache for LLM responses, keyed on a hash of the model,
+    system prompt and user prompt.
+
+    All calls in this project run at temperature 0, so identical inputs
+    yield (nominally) identical outputs and repeat evaluation runs - the
+    common case while tuning prompts - become near-instant cache reads.
+    Backed by SQLite so it needs no extra services or dependencies.
+    """
+
+    def __init__(self, path="response_cache.db", ttl=CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(model_key, system_prompt, prompt):
+        h = hashlib.sha256()
+        for part in (model_key, system_prompt, prompt):
+            h.update(part.encode())
+            h.update(b"\x00")
+        return h.hexdigest()
+
+    def get(self, key):
+        """Returns the cached response, or None on miss/expiry."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, created = row
+            if time.time() - created > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return response
+
+    def put(self, key, response):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+            self._conn.commit()
@@ -1,6 +1,11 @@
 from SPARQLWrapper import SPARQLWrapper, JSON
+import re
 import time
 
+# Leading prologue declarations (PREFIX/BASE), which must stay outside
+# any subquery wrapper
+_PROLOGUE_DECL_RE = re.compile(r'\s*(?:PREFIX\s+[\w-]*:\s*<[^>]*>|BASE\s*<[^>]*>)', re.IGNORECASE)
+
 class SPARQLClient:
     def __init__(self, endpoint_url):
         self.endpoint_url = endpoint_url
@@ -32,3 +37,35 @@ class SPARQLClient:
         except Exception as e:
             print(f"SPARQL Error: {e}")
             return None
+
+    def execute_count(self, query):
+        """
+        Counts the results of a SELECT query without transferring them.
+        Wraps the query in a COUNT(*) subquery, so the endpoint sends back
+        one row instead of the full (potentially huge) binding set that
+        execute_query would parse just to take its length.
+        Returns the count as an int, or None on failure.
+        """
+        # PREFIX/BASE declarations are only legal at the top of a query, so
+        # hoist them above the wrapper; generated queries always have them
+        pos = 0
+        while True:
+            match = _PROLOGUE_DECL_RE.match(query, pos)
+            if not match:
+                break
+            pos = match.end()
+        prologue, body = query[:pos], query[pos:]
+
+        count_query = f"{prologue}\nSELECT (COUNT(*) AS ?count) WHERE {{ {{ {body} }} }}"
+        try:
+            self.wrapper.setQuery(count_query)
+            results = self.wrapper.query().convert()
+
+            bindings = results.get("results", {}).get("bindings", [])
+            if not bindings:
+                return 0
+            return int(bindings[0]["count"]["value"])
+
+        except Exception as e:
+            print(f"SPARQL Error: {e}")
+            return None
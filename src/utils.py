@@ -1,7 +1,28 @@
 import os
+import json
 import yaml
 from dotenv import load_dotenv
 
+# Optional fast JSON backend; stdlib json is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_loads(data):
+    """Parses JSON from a str or bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps_bytes(obj, indent=False):
+    """Serializes an object to UTF-8 JSON bytes, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        return json.dumps(obj, indent=2).encode()
+    return json.dumps(obj, separators=(',', ':')).encode()
+
 def load_config(config_path="config.yaml"):
     """Loads the YAML configuration file."""
     if not os.path.exists(config_path):